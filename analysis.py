@@ -1,10 +1,71 @@
-import matplotlib.pyplot as plt
-from collections import Counter
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Dict, Tuple
 import numpy as np
 
+# matplotlib импортируется лениво внутри функций построения графиков:
+# его загрузка заметно замедляет старт CLI
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
 
-def analyze_predictions_distribution(predicts: List[Dict]) -> None:
+
+STARS = [1, 2, 3, 4, 5]
+SENTIMENT_CATEGORIES = ['negative', 'neutral', 'positive']
+
+# Индекс - число звезд (0 не используется), значение - индекс в SENTIMENT_CATEGORIES
+_STAR_TO_SENTIMENT_CODE = np.array([0, 0, 0, 1, 2, 2], dtype=np.uint8)
+
+# Закэшированные фигуры: ключ -> (fig, axes)
+_FIG_CACHE = {}
+
+
+@dataclass
+class Predictions:
+    """
+    Предсказания модели в колоночном виде: по одному массиву на поле.
+    
+    Attributes
+    ----------
+    texts : np.ndarray
+        Массив фраз (dtype=object)
+    stars : np.ndarray
+        Массив звездных оценок 1-5 (dtype=uint8)
+    scores : np.ndarray
+        Массив уверенности модели (dtype=float32)
+    """
+    texts: np.ndarray
+    stars: np.ndarray
+    scores: np.ndarray
+
+    @classmethod
+    def from_pipeline(cls, predicts: List[Dict], texts: List[str]) -> 'Predictions':
+        """
+        Собирает колонки из выхода HuggingFace pipeline.
+        
+        Parameters
+        ----------
+        predicts : List[Dict]
+            Список словарей с предсказаниями модели в формате:
+            [{'label': '4 stars', 'score': 0.95}, ...]
+        texts : List[str]
+            Список фраз, для которых получены предсказания
+        
+        Returns
+        -------
+        Predictions
+            Предсказания в колоночном виде.
+        """
+        n = len(predicts)
+        # первый символ метки ('1 star' ... '5 stars') кодирует число звезд
+        stars = np.fromiter((ord(pred['label'][0]) for pred in predicts), dtype=np.uint8, count=n) - ord('0')
+        scores = np.fromiter((pred['score'] for pred in predicts), dtype=np.float32, count=n)
+        return cls(texts=np.array(texts, dtype=object), stars=stars, scores=scores)
+
+    def __len__(self) -> int:
+        return len(self.stars)
+
+
+def analyze_predictions_distribution(predicts: Predictions, show_plots: bool = True) -> None:
     """
     Анализирует распределение предсказаний модели и визуализирует результаты.
     
@@ -13,9 +74,10 @@ def analyze_predictions_distribution(predicts: List[Dict]) -> None:
     
     Parameters
     ----------
-    predicts : List[Dict]
-        Список словарей с предсказаниями модели в формате:
-        [{'label': '4 stars', 'score': 0.95}, ...]
+    predicts : Predictions
+        Предсказания модели в колоночном виде
+    show_plots : bool
+        Строить ли графики (по умолчанию True)
     
     Returns
     -------
@@ -27,30 +89,58 @@ def analyze_predictions_distribution(predicts: List[Dict]) -> None:
     print("="*50)
     
     # 1. Получаем оценки от модели
-    star_predictions = [pred['label'] for pred in predicts]
-    
-    # 2. Преобразуем в числа
-    star_to_number = {
-        '1 star': 1, '2 stars': 2, '3 stars': 3, '4 stars': 4, '5 stars': 5
-    }
-    numeric_scores = [star_to_number[pred] for pred in star_predictions]
-    
-    # 3. Назначаем категории
-    star_to_sentiment = {
-        '1 star': 'negative', '2 stars': 'negative',
-        '3 stars': 'neutral', 
-        '4 stars': 'positive', '5 stars': 'positive'
-    }
-    categories = [star_to_sentiment[pred] for pred in star_predictions]
+    stars_arr = predicts.stars
+    
+    # 2. Считаем количество предсказаний для каждой звезды (1-5)
+    star_counts = np.bincount(stars_arr, minlength=6)[1:6]
+    
+    # 3. Назначаем категории через таблицу 0=negative, 1=neutral, 2=positive
+    sentiment_counts = np.bincount(_STAR_TO_SENTIMENT_CODE[stars_arr], minlength=3)
     
     # 4. Строим bar plot распределения
-    _create_plots(numeric_scores, categories, star_predictions)
+    if show_plots:
+        _create_plots(star_counts, sentiment_counts)
     
     # 5. Выводим доли
-    _print_statistics(numeric_scores, categories, len(predicts))
+    _print_statistics(star_counts, sentiment_counts, len(predicts), stars_arr.mean(), np.median(stars_arr))
 
 
-def _create_plots(numeric_scores: List[int], categories: List[str], star_predictions: List[str]) -> None:
+def _get_figure(key: str, ncols: int, figsize: Tuple[int, int]) -> Tuple['Figure', List['Axes']]:
+    """
+    Возвращает закэшированную фигуру с очищенными осями или создает новую.
+    
+    Если фигура уже была закрыта (например, окно графика закрыл пользователь), создается заново.
+    
+    Parameters
+    ----------
+    key : str
+        Ключ фигуры в кэше
+    ncols : int
+        Количество графиков в строке
+    figsize : Tuple[int, int]
+        Размер фигуры
+    
+    Returns
+    -------
+    Tuple[Figure, List[Axes]]
+        Фигура и список ее осей.
+    """
+    import matplotlib.pyplot as plt
+    
+    cached = _FIG_CACHE.get(key)
+    if cached is not None and plt.fignum_exists(cached[0].number):
+        fig, axes = cached
+        for ax in axes:
+            ax.clear()
+    else:
+        fig, axes = plt.subplots(1, ncols, figsize=figsize, squeeze=False)
+        axes = list(axes[0])
+        _FIG_CACHE[key] = (fig, axes)
+    
+    return fig, axes
+
+
+def _create_plots(star_counts: np.ndarray, sentiment_counts: np.ndarray) -> None:
     """
     Создает столбчатые диаграммы распределения предсказаний.
     
@@ -58,100 +148,93 @@ def _create_plots(numeric_scores: List[int], categories: List[str], star_predict
     
     Parameters
     ----------
-    numeric_scores : List[int]
-        Список числовых оценок (1-5)
-    categories : List[str]
-        Список категорий настроения ('negative', 'neutral', 'positive')
-    star_predictions : List[str]
-        Список исходных звездных оценок
+    star_counts : np.ndarray
+        Количество предсказаний для каждой звездной оценки (1-5)
+    sentiment_counts : np.ndarray
+        Количество предсказаний для каждой категории ('negative', 'neutral', 'positive')
     
     Returns
     -------
     None
         Отображает matplotlib графики.
     """
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    import matplotlib.pyplot as plt
+    
+    fig, (ax1, ax2) = _get_figure('distribution', 2, (12, 5))
     
     # Bar plot для звезд
-    star_counts = Counter(numeric_scores)
-    stars = sorted(star_counts.keys())
-    counts = [star_counts[star] for star in stars]
+    stars = STARS
+    counts = star_counts.tolist()
     
     colors = ['red', 'orange', 'yellow', 'lightgreen', 'green']
-    bars1 = ax1.bar(stars, counts, color=colors[:len(stars)])
+    bars1 = ax1.bar(stars, counts, color=colors)
     ax1.set_xlabel('Количество звезд')
     ax1.set_ylabel('Количество отзывов')
     ax1.set_title('Распределение по звездам')
     ax1.set_xticks(stars)
     
-    for bar, count in zip(bars1, counts):
-        height = bar.get_height()
-        ax1.text(bar.get_x() + bar.get_width()/2., height, f'{count}', 
-                ha='center', va='bottom', fontweight='bold')
+    ax1.bar_label(bars1, labels=[str(count) for count in counts], fontweight='bold')
     
     # Bar plot для категорий
-    category_counts = Counter(categories)
-    categories_list = ['negative', 'neutral', 'positive']
+    categories_list = SENTIMENT_CATEGORIES
     category_colors = ['red', 'yellow', 'green']
-    counts_cat = [category_counts[cat] for cat in categories_list]
+    counts_cat = sentiment_counts.tolist()
     
     bars2 = ax2.bar(categories_list, counts_cat, color=category_colors)
     ax2.set_xlabel('Категория настроения')
     ax2.set_ylabel('Количество отзывов')
     ax2.set_title('Распределение по категориям настроения')
     
-    for bar, count in zip(bars2, counts_cat):
-        height = bar.get_height()
-        ax2.text(bar.get_x() + bar.get_width()/2., height, f'{count}', 
-                ha='center', va='bottom', fontweight='bold')
+    ax2.bar_label(bars2, labels=[str(count) for count in counts_cat], fontweight='bold')
     
     plt.tight_layout()
     plt.show()
 
 
-def _print_statistics(numeric_scores: List[int], categories: List[str], total: int) -> None:
+def _print_statistics(star_counts: np.ndarray, sentiment_counts: np.ndarray, total: int,
+                      mean_rating: float, median_rating: float) -> None:
     """
     Выводит статистику распределения предсказаний.
     
     Parameters
     ----------
-    numeric_scores : List[int]
-        Список числовых оценок (1-5)
-    categories : List[str]
-        Список категорий настроения
+    star_counts : np.ndarray
+        Количество предсказаний для каждой звездной оценки (1-5)
+    sentiment_counts : np.ndarray
+        Количество предсказаний для каждой категории настроения
     total : int
         Общее количество предсказаний
+    mean_rating : float
+        Средняя звездная оценка
+    median_rating : float
+        Медианная звездная оценка
     
     Returns
     -------
     None
         Выводит статистику в консоль.
     """
-    star_counts = Counter(numeric_scores)
-    category_counts = Counter(categories)
-    
     print("\nСТАТИСТИКА РАСПРЕДЕЛЕНИЯ:")
     print("-" * 40)
     
     print("\nПо звездам:")
-    for star in sorted(star_counts.keys()):
-        count = star_counts[star]
+    for star, count in zip(STARS, star_counts.tolist()):
+        if not count:
+            continue
         percentage = (count / total) * 100
         print(f"  {star} звезд: {count:3d} отзывов ({percentage:5.1f}%)")
     
     print("\nПо категориям настроения:")
-    categories_list = ['negative', 'neutral', 'positive']
-    for category in categories_list:
-        count = category_counts[category]
+    for category, count in zip(SENTIMENT_CATEGORIES, sentiment_counts.tolist()):
         percentage = (count / total) * 100
         print(f"  {category:8}: {count:3d} отзывов ({percentage:5.1f}%)")
     
     print(f"\nОбщее количество отзывов: {total}")
-    print(f"Средний рейтинг: {np.mean(numeric_scores):.2f}")
-    print(f"Медианный рейтинг: {np.median(numeric_scores):.1f}")
+    print(f"Средний рейтинг: {mean_rating:.2f}")
+    print(f"Медианный рейтинг: {median_rating:.1f}")
 
 
-def analyze_confidence_scores(predicts: List[Dict]) -> None:
+def analyze_confidence_scores(predicts: Predictions, show_plots: bool = True) -> None:
     """
     Анализирует распределение уверенности модели в предсказаниях.
     
@@ -159,29 +242,40 @@ def analyze_confidence_scores(predicts: List[Dict]) -> None:
     
     Parameters
     ----------
-    predicts : List[Dict]
-        Список словарей с предсказаниями модели
+    predicts : Predictions
+        Предсказания модели в колоночном виде
+    show_plots : bool
+        Строить ли гистограмму (по умолчанию True)
     
     Returns
     -------
     None
         Отображает гистограмму и выводит статистику в консоль.
     """
-    confidence_scores = [pred['score'] for pred in predicts]
+    confidence_scores = predicts.scores
+    min_score, median_score, max_score = np.percentile(confidence_scores, [0, 50, 100])
+    mean_score = confidence_scores.mean()
     
     print("\n" + "="*50)
     print("АНАЛИЗ УВЕРЕННОСТИ МОДЕЛИ:")
     print("="*50)
     
-    plt.figure(figsize=(10, 5))
-    plt.hist(confidence_scores, bins=20, alpha=0.7, color='blue', edgecolor='black')
-    plt.xlabel('Уверенность модели')
-    plt.ylabel('Количество предсказаний')
-    plt.title('Распределение уверенности модели в предсказаниях')
-    plt.grid(True, alpha=0.3)
-    plt.show()
+    if show_plots:
+        import matplotlib.pyplot as plt
+        
+        # Гистограмма считается в NumPy, matplotlib только рисует готовые столбцы
+        hist, bin_edges = np.histogram(confidence_scores, bins=20)
+        
+        fig, (ax,) = _get_figure('confidence', 1, (10, 5))
+        ax.bar(bin_edges[:-1], hist, width=np.diff(bin_edges), align='edge',
+               alpha=0.7, color='blue', edgecolor='black')
+        ax.set_xlabel('Уверенность модели')
+        ax.set_ylabel('Количество предсказаний')
+        ax.set_title('Распределение уверенности модели в предсказаниях')
+        ax.grid(True, alpha=0.3)
+        plt.show()
     
-    print(f"Средняя уверенность: {np.mean(confidence_scores):.3f}")
-    print(f"Медианная уверенность: {np.median(confidence_scores):.3f}")
-    print(f"Минимальная уверенность: {np.min(confidence_scores):.3f}")
-    print(f"Максимальная уверенность: {np.max(confidence_scores):.3f}")
\ No newline at end of file
+    print(f"Средняя уверенность: {mean_score:.3f}")
+    print(f"Медианная уверенность: {median_score:.3f}")
+    print(f"Минимальная уверенность: {min_score:.3f}")
+    print(f"Максимальная уверенность: {max_score:.3f}")
\ No newline at end of file
@@ -1,7 +1,11 @@
-from analysis import analyze_predictions_distribution
+from analysis import analyze_predictions_distribution, Predictions
 from pathlib import Path
 from enum import Enum
+from collections import OrderedDict
+from functools import lru_cache
 import os.path
+import sys
+import numpy as np
 import torch
 
 from transformers import pipeline
@@ -10,12 +14,54 @@ from parser import get_parser
 from config_loader import load_config, Config
 
 
+MODEL_NAME = 'nlptown/bert-base-multilingual-uncased-sentiment'
+BATCH_SIZE = 32
+PREDICTS_CACHE_SIZE = 10_000
+
+# LRU cache of predicts between calls: (model name, phrase) -> predict
+_PREDICTS_CACHE = OrderedDict()
+
+
 class Labels(Enum):
     POSITIVE = "positive"
     NEGATIVE = "negative"
     NEUTRAL = "neutral"
 
 
+_LABEL_VALUES = frozenset(label.value for label in Labels)
+_LABEL_CODES = {label.value: code for code, label in enumerate(Labels)}
+
+# index is number of stars (0 is unused)
+_STARS_TO_SENTIMENT = np.array([
+    None,
+    Labels.NEGATIVE.value,
+    Labels.NEGATIVE.value,
+    Labels.NEUTRAL.value,
+    Labels.POSITIVE.value,
+    Labels.POSITIVE.value
+], dtype=object)
+
+
+def _iter_clean_lines(path: str | Path):
+    '''Stream stripped non-empty lines of text file.
+    
+    Parameters
+    ----------
+    path: str | Path
+        Path to text file
+    
+    Yields
+    -------
+    str
+        Stripped non-empty line
+    '''
+    with open(path, "r", encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line
+
+
 def check_labels(labels: list[str]) -> bool:
     '''Check that labels-file is valid.
     
@@ -29,11 +75,7 @@ def check_labels(labels: list[str]) -> bool:
     bool
         Valid or not valid    
     '''
-    for label in labels:
-        label = Labels(label)
-        if ((label != Labels.POSITIVE) and (label != Labels.NEGATIVE) and (label != Labels.NEUTRAL)):
-            return False
-    return True
+    return all(label in _LABEL_VALUES for label in labels)
 
 def count_metrics(labels_path: str | Path, data: list[dict]) -> int:
     '''Calculate some metric(now only accuracy).
@@ -51,63 +93,142 @@ def count_metrics(labels_path: str | Path, data: list[dict]) -> int:
     int
         Values of metrics (now only accuracy)
     '''
-    good_preds_count = 0
-
-    with open(labels_path, "r", encoding='utf-8') as file:
-        lines = [line.strip().lower() for line in file.readlines() if line.strip()]
-
-        if not check_labels(lines):
-            raise ValueError("Неправильный формат меток!")
-
-        for i, label in enumerate(lines):
-            dict_i = data[i]
-            text = dict_i['text']
-            predict = dict_i['label']
-
-            print(f"{text} : {predict} : {label}")
-
-            if label == predict:
-                good_preds_count += 1
+    # читаем файл целиком и режем на строки за одну операцию вместо построчного итератора
+    text = Path(labels_path).read_text(encoding='utf-8').lower()
+    labels = [line for line in map(str.strip, text.splitlines()) if line]
+
+    if not check_labels(labels):
+        bad_labels = [label for label in labels if label not in _LABEL_VALUES]
+        raise ValueError(f"Неправильный формат меток: {bad_labels}!")
+
+    if len(labels) > len(data):
+        raise ValueError(f"Меток ({len(labels)}) больше, чем предсказаний ({len(data)})!")
+
+    rows = [f"{dict_i['text']} : {dict_i['label']} : {label}" for dict_i, label in zip(data, labels)]
+    if rows:
+        sys.stdout.write("\n".join(rows) + "\n")
+
+    # сравниваем метки и предсказания как int8-коды за один проход
+    label_codes = np.fromiter(map(_LABEL_CODES.__getitem__, labels), dtype=np.int8, count=len(labels))
+    predict_codes = np.fromiter(
+        (_LABEL_CODES[dict_i['label']] for dict_i in data[:len(labels)]), dtype=np.int8, count=len(labels)
+    )
+    good_preds_count = int((label_codes == predict_codes).sum())
     
     return good_preds_count
 
 
-def convert_to_readable(predicts: list[dict], texts: list[str]) -> list[dict]:
+def convert_to_readable(predicts: Predictions) -> list[dict]:
     """We need predicts in readable format.
     
     Parameters
     ----------
-    predicts: list[dict]
-        List of dicts in format: predicts[i] = {'label': n star, 'score': x}
-    texts: list[str]
-        Phrases in test data
+    predicts: Predictions
+        Columnar predicts of the model with phrases in test data
     
     Returns
     -------
     list[dict]
         New list of dicts in readable format: predicts[i] = {'text': <phrase>, 'label': <sentiment>, 'score': x}
     """
-    star_to_sentiment = {
-        '1 star': Labels.NEGATIVE.value,
-        '2 stars': Labels.NEGATIVE.value,
-        '3 stars': Labels.NEUTRAL.value, 
-        '4 stars': Labels.POSITIVE.value,
-        '5 stars': Labels.POSITIVE.value
-    }
-    
-    readable_results = []
-    for text, pred in zip(texts, predicts):
-        label = pred['label']
-        score = pred['score']
-        readable_results.append({
-            'text': text,
-            'label': star_to_sentiment[label],
-            'confidence': round(score, 4)
-        })
+    labels = _STARS_TO_SENTIMENT[predicts.stars].tolist()
+    # float64 so that rounded values don't get float32 tails
+    confidences = np.round(predicts.scores.astype(np.float64), 4).tolist()
+
+    readable_results = [
+        {'text': text, 'label': label, 'confidence': confidence}
+        for text, label, confidence in zip(predicts.texts.tolist(), labels, confidences)
+    ]
     
     return readable_results
 
 
+@lru_cache(maxsize=1)
+def _configure_cpu_threads() -> None:
+    '''Let torch use all CPU cores for inference (done once per process).'''
+    n_cpus = os.cpu_count() or 1
+    torch.set_num_threads(n_cpus)
+    try:
+        torch.set_num_interop_threads(min(4, n_cpus))
+    except RuntimeError:
+        # inter-op pool is already started, its size can't be changed
+        pass
+
+
+@lru_cache(maxsize=4)
+def _get_classifier(model_name: str):
+    '''Load classifier once per model name and reuse it in next calls.
+    
+    On CPU torch uses all cores and linear layers of the model are
+    dynamically quantized to int8.
+    
+    Parameters
+    ------------
+    model_name: str
+        Name of the model on HuggingFace Hub
+    '''
+    device = 0 if torch.cuda.is_available() else -1
+    classifier = pipeline('sentiment-analysis', model=model_name, device=device)
+
+    if device == -1:
+        _configure_cpu_threads()
+        classifier.model = torch.ao.quantization.quantize_dynamic(
+            classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return classifier
+
+
+def classify(classifier, lines: list[str], batch_size: int = BATCH_SIZE) -> list[dict]:
+    '''Run classifier on phrases by batches.
+    
+    Only unique phrases that are not in the predicts cache go to the model.
+    They are sorted by length so that each batch is padded to similar size,
+    after inference predicts are returned in original order. Inference runs
+    in inference mode with fp16 autocast on GPU (on CPU model is already int8).
+    
+    Parameters
+    ------------
+    classifier
+        HuggingFace sentiment-analysis pipeline
+    lines: list[str]
+        Phrases for classification
+    batch_size: int
+        Number of phrases in one forward pass
+    
+    Returns
+    ------------
+    list[dict]
+        List of dicts in format: predicts[i] = {'label': n star, 'score': x}
+    '''
+    model_name = classifier.model.name_or_path
+    known = {}
+    new_lines = []
+    for line in dict.fromkeys(lines):
+        key = (model_name, line)
+        if key in _PREDICTS_CACHE:
+            _PREDICTS_CACHE.move_to_end(key)
+            known[line] = _PREDICTS_CACHE[key]
+        else:
+            new_lines.append(line)
+
+    if new_lines:
+        order = sorted(range(len(new_lines)), key=lambda i: len(new_lines[i].split()))
+
+        # без отслеживания градиентов; на GPU в fp16, на CPU модель уже квантована в int8
+        on_gpu = classifier.device.type == 'cuda'
+        with torch.inference_mode(), torch.autocast('cuda', dtype=torch.float16, enabled=on_gpu):
+            raw = classifier([new_lines[i] for i in order], batch_size=batch_size, truncation=True)
+
+        for k, i in enumerate(order):
+            known[new_lines[i]] = raw[k]
+            _PREDICTS_CACHE[(model_name, new_lines[i])] = raw[k]
+
+        while len(_PREDICTS_CACHE) > PREDICTS_CACHE_SIZE:
+            _PREDICTS_CACHE.popitem(last=False)
+
+    return [known[line] for line in lines]
+
+
 def sentiment_classification(opts: Config):
     '''Create sentiment classifier.
     
@@ -124,32 +245,35 @@ def sentiment_classification(opts: Config):
         raise Exception(f"Файл {opts.labels_path} не найден!")
 
     try:
-        classifier = pipeline('sentiment-analysis', model='nlptown/bert-base-multilingual-uncased-sentiment')
+        classifier = _get_classifier(MODEL_NAME)
     except:
         raise Exception("Failed in download classifier")
 
     print("Начинаем обработку фраз!")
 
-    with open(opts.data_path, "r", encoding='utf-8') as file:
-        lines = [line.strip() for line in file.readlines() if line.strip()]
+    lines = list(_iter_clean_lines(opts.data_path))
 
-        predicts = classifier(lines)
+    predicts = Predictions.from_pipeline(classify(classifier, lines), lines)
 
-        predicts = [predict for predict in predicts]
+    readable_predicts = convert_to_readable(predicts)
 
-        readable_predicts = convert_to_readable(predicts, lines)
+    show_plots = opts.get('plot', True)
+    if show_plots and opts.get('plot_backend'):
+        # backend нужно выбрать до первого импорта matplotlib.pyplot
+        import matplotlib
+        matplotlib.use(opts.plot_backend)
 
-        analyze_predictions_distribution(predicts)
+    analyze_predictions_distribution(predicts, show_plots=show_plots)
 
-        print("\nРезультаты классификации:")
-        print("-" * 50)
-        print(f"<phrase> : <predict> : <label>")
+    print("\nРезультаты классификации:")
+    print("-" * 50)
+    print(f"<phrase> : <predict> : <label>")
 
-        good_preds_count = count_metrics(opts.labels_path, readable_predicts)
-        accuracy = float(good_preds_count)/len(readable_predicts) if readable_predicts else 0
+    good_preds_count = count_metrics(opts.labels_path, readable_predicts)
+    accuracy = float(good_preds_count)/len(readable_predicts) if readable_predicts else 0
 
-        print("-" * 50)
-        print(f"Точность(Accuracy) предсказаний модели: {accuracy}")
+    print("-" * 50)
+    print(f"Точность(Accuracy) предсказаний модели: {accuracy}")
 
 
 def main():
@@ -160,6 +284,8 @@ def main():
     # создаем отдельный объект класса Config 
     # (удобно для дальнейшей работы и большого коо-ва параметров)
     opts = load_config(args.config_path)
+    if args.no_plot:
+        opts.plot = False
 
     sentiment_classification(opts)
 
@@ -17,5 +17,10 @@ def get_parser() -> argparse.ArgumentParser:
         help="Path to yml config",
         required=True,
     )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        help="Skip building plots",
+    )
 
     return parser
\ No newline at end of file